@@ -0,0 +1,489 @@
+# =========================================================
+# SHARED CORE FOR THE FSN DASHBOARD APPS
+# Loading, filtering, aggregation and cached chart builders used by
+# main.py and fsn_dashboard_app.py
+# =========================================================
+
+import hashlib
+import io
+import os
+import tempfile
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import streamlit as st
+
+# ==========================================
+# CONSTANTS
+# ==========================================
+
+# Use the URL for robust deployment
+CLEANED_CSV_URL = 'https://raw.githubusercontent.com/s22a0058-ai/FYP/refs/heads/main/cleaned_UMK_DATA_ANAK_2022.csv'
+
+# Informational pie/bar charts render once without hover/zoom handlers or a mode bar
+STATIC_CHART_CONFIG = {"staticPlot": True, "displayModeBar": False}
+
+# Usability questionnaire responses (written by main.py's Usability Evaluation tab)
+FEEDBACK_CSV_PATH = "usability_responses.csv"
+FEEDBACK_SCORE_COLUMNS = [
+    "Q1_Easy_Navigation", "Q2_Clear_Information", "Q3_Visual_Appeal",
+    "Q4_Easy_Filters", "Q5_Charts_Helpful", "Q6_Useful_Insights",
+    "Q7_Identify_Trends", "Q8_Overall_Satisfaction",
+]
+
+# Only the columns the dashboard uses are parsed, with their final dtypes
+USECOLS = [
+    "JANTINA", "BANGSA", "DAERAH", "AGAMA", "Status_Pemakanan", "Pendapatan_Keluarga", "PARLIMEN", "DUN",
+    "Umur_Bulan", "Berat_KG", "Tinggi_CM", "Gaji_Bapa", "Gaji_Ibu", "Gaji_Penjaga", "BMI",
+]
+DTYPES = {
+    # Low-cardinality text columns as categoricals (int codes for isin/groupby)
+    "JANTINA": "category", "BANGSA": "category", "DAERAH": "category", "AGAMA": "category",
+    "Status_Pemakanan": "category", "Pendapatan_Keluarga": "category", "PARLIMEN": "category", "DUN": "category",
+    # float32 is ample for months, kg, cm, BMI and RM salaries and halves the bytes moved
+    "Umur_Bulan": "float32", "Berat_KG": "float32", "Tinggi_CM": "float32", "BMI": "float32",
+    "Gaji_Bapa": "float32", "Gaji_Ibu": "float32", "Gaji_Penjaga": "float32",
+}
+
+# ==========================================
+# DATA LOADING AND PREPARATION
+# ==========================================
+
+# Bump whenever _load_and_clean_raw changes what it produces, so existing
+# Parquet copies are not served with stale columns or ordering
+PREP_VERSION = 1
+
+def parquet_cache_path(file_url):
+    """Local Parquet copy of the prepared data, named after everything that shapes it."""
+    fingerprint = repr((file_url, USECOLS, sorted(DTYPES.items()), PREP_VERSION))
+    digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+    return Path(__file__).with_name(f"cleaned_UMK_DATA_ANAK_2022.{digest}.parquet")
+
+def _write_parquet_atomically(df, path):
+    """Writes to a temp file beside path and renames it, so readers never see a partial file."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_name, compression="zstd")
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+# Seconds to wait on the source host before giving up on a fetch
+SOURCE_FETCH_TIMEOUT = 15
+
+def _local_source_path(file_url):
+    """The copy of file_url shipped next to this module (same file name), if any."""
+    local = Path(__file__).with_name(Path(urllib.parse.urlparse(file_url).path).name)
+    return local if local.is_file() else None
+
+# cache_resource, like the loaded frame: st.cache_data would copy these ~10 MB on every rerun
+@st.cache_resource(show_spinner=False)
+def source_csv_bytes(file_url):
+    """The untouched source CSV (all columns, original row order), read once per source."""
+    # The repo ships the same CSV, so normally no network round-trip is needed
+    local = _local_source_path(file_url)
+    if local is not None:
+        return local.read_bytes()
+    if file_url.startswith(("http://", "https://")):
+        with urllib.request.urlopen(file_url, timeout=SOURCE_FETCH_TIMEOUT) as response:
+            return response.read()
+    return Path(file_url).read_bytes()
+
+def download_csv_bytes(file_url):
+    """source_csv_bytes() for the download button as (bytes, error); a failed fetch is remembered per session."""
+    # cache_resource does not cache exceptions, so without this every rerun would fetch again
+    failures = st.session_state.setdefault("source_csv_failures", {})
+    if file_url in failures:
+        return None, failures[file_url]
+    try:
+        return source_csv_bytes(file_url), None
+    except Exception as e:
+        failures[file_url] = str(e)
+        return None, failures[file_url]
+
+def _load_and_clean_raw(file_url):
+    """Downloads the raw CSV and applies the column preparation."""
+    # Load Dataset from URL (dtypes are applied while parsing); the same bytes feed the download
+    df = pd.read_csv(io.BytesIO(source_csv_bytes(file_url)), engine="pyarrow", usecols=USECOLS, dtype=DTYPES)
+    
+    # Calculate Average Parental Income (NaN-skipping like mean(axis=1), but in one NumPy pass)
+    father = df["Gaji_Bapa"].to_numpy()
+    mother = df["Gaji_Ibu"].to_numpy()
+    df["Avg_Parental_Income"] = np.where(
+        np.isnan(father), mother, np.where(np.isnan(mother), father, (father + mother) * 0.5)
+    ).astype("float32")
+
+    # Keep rows grouped by the filter columns so filtered slices are mostly contiguous
+    df = df.sort_values(["JANTINA", "BANGSA", "DAERAH"], kind="stable", ignore_index=True)
+
+    return df
+
+# cache_resource hands every rerun and session the same frame instead of
+# unpickling a fresh copy each time. It is read-only: never mutate it in place.
+# Failures raise, so they are not cached and the next rerun retries.
+@st.cache_resource(show_spinner=False)
+def _load_prepared(file_url):
+    """Reads the prepared Parquet copy, or rebuilds it from the CSV."""
+    cache_path = parquet_cache_path(file_url)
+
+    # Parquet keeps the prepared dtypes, so later runs skip the download and parsing
+    if cache_path.exists():
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception:
+            pass  # Unreadable copy: re-parse the CSV below and overwrite it
+
+    df = _load_and_clean_raw(file_url)
+
+    try:
+        _write_parquet_atomically(df, cache_path)
+    except OSError:
+        pass  # Read-only deployments simply skip the local copy
+
+    return df
+
+def load_and_prepare_data(file_url):
+    """Loads, processes, and prepares the dataset."""
+    try:
+        return _load_prepared(file_url)
+    except Exception as e:
+        st.error(f"Error loading data from URL. Please check the path. Details: {e}")
+        return pd.DataFrame()
+
+# ==========================================
+# FILTERING AND AGGREGATION
+# ==========================================
+
+def filter_options(df):
+    """Sidebar multiselect options for JANTINA, BANGSA and DAERAH."""
+    # The categories are already the sorted non-null distinct values, so no column scan is needed
+    return {col: df[col].cat.categories.tolist() for col in ("JANTINA", "BANGSA", "DAERAH")}
+
+def make_filter_key(genders, races, districts):
+    """Sidebar selections as sorted tuples: a hashable, order-insensitive cache key."""
+    return tuple(sorted(genders)), tuple(sorted(races)), tuple(sorted(districts))
+
+def apply_filters(df, genders, races, districts):
+    """Returns the rows matching the sidebar selections."""
+    mask = None
+    for col, selected in (("JANTINA", genders), ("BANGSA", races), ("DAERAH", districts)):
+        # Match on the integer category codes; unknown values map to -1, which is also NaN's code
+        categories = df[col].cat.categories
+        codes = categories.get_indexer(list(selected))
+        codes = np.unique(codes[codes >= 0])
+        column_codes = df[col].cat.codes.to_numpy()
+        # Every category selected and no missing values: this column cannot drop any row
+        if len(codes) == len(categories) and not (column_codes < 0).any():
+            continue
+        column_mask = np.isin(column_codes, codes)
+        mask = column_mask if mask is None else mask & column_mask
+    return df if mask is None else df[mask]
+
+def robust_range(series):
+    """Q1-3*IQR..Q3+3*IQR clamped to the observed values, or None if the series is empty."""
+    values = series.to_numpy(dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    q1, q3 = np.percentile(values, [25, 75])
+    iqr = q3 - q1
+    return (max(q1 - 3 * iqr, values.min()), min(q3 + 3 * iqr, values.max()))
+
+def fit_trend_lines(frame, x, y, by, y_range=None):
+    """Least-squares line per group as {group: (slope, intercept, x_min, x_max)}, fitted on rows with y in y_range."""
+    points = frame[[by, x, y]].dropna()
+    if y_range is not None:
+        # Fit on the same points the chart shows, so outliers cannot drag the line off the axis
+        points = points[points[y].between(*y_range)]
+    trends = {}
+    for group, sub in points.groupby(by, observed=True, sort=False):
+        if sub[x].nunique() < 2:
+            continue  # a single x value has no slope
+        slope, intercept = np.polyfit(sub[x].to_numpy(dtype=float), sub[y].to_numpy(dtype=float), 1)
+        trends[group] = (slope, intercept, sub[x].min(), sub[x].max())
+    return trends
+
+def bin_points(frame, x, y, by, nbinsx, nbinsy, y_range):
+    """Server-side 2-D histogram of (x, y) per group on shared bin edges, with y binned over y_range."""
+    points = frame[[by, x, y]].dropna()
+    x_values = points[x].to_numpy(dtype=float)
+    y_values = points[y].to_numpy(dtype=float)
+    if len(points) == 0:
+        return {"x_edges": np.array([]), "y_edges": np.array([]), "counts": {}, "outside": 0}
+
+    x_edges = np.histogram_bin_edges(x_values, bins=nbinsx)
+    y_edges = np.histogram_bin_edges(y_values, bins=nbinsy, range=y_range)
+
+    counts = {}
+    for group, sub in points.groupby(by, observed=True):
+        hist, _, _ = np.histogram2d(sub[x].to_numpy(dtype=float), sub[y].to_numpy(dtype=float), bins=[x_edges, y_edges])
+        counts[group] = hist.T  # Heatmap z is indexed [y][x]
+
+    # histogram2d drops points beyond the edges; x spans its full range, so only y can fall outside
+    outside = int(((y_values < y_edges[0]) | (y_values > y_edges[-1])).sum())
+    return {"x_edges": x_edges, "y_edges": y_edges, "counts": counts, "outside": outside}
+
+def clip_segment(trend, y_low, y_high):
+    """Part of a fit_trend_lines() line inside y_low..y_high as (x_start, x_end, slope, intercept), or None."""
+    slope, intercept, x_min, x_max = trend
+    if slope == 0:
+        return (x_min, x_max, slope, intercept) if y_low <= intercept <= y_high else None
+    # x where the line crosses the two y bounds, intersected with its own x extent
+    x_a, x_b = sorted(((y_low - intercept) / slope, (y_high - intercept) / slope))
+    x_start, x_end = max(x_min, x_a), min(x_max, x_b)
+    return (x_start, x_end, slope, intercept) if x_start < x_end else None
+
+def pearson_corr(x, y):
+    """Pearson correlation over rows where both columns are present (NaN if undefined)."""
+    a = x.to_numpy(dtype="float64")
+    b = y.to_numpy(dtype="float64")
+    both = ~(np.isnan(a) | np.isnan(b))
+    if both.sum() < 2:
+        return np.nan
+    # A constant column has no correlation; corrcoef returns NaN for it
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return float(np.corrcoef(a[both], b[both])[0, 1])
+
+def counts(series, name):
+    """Value counts as a tidy (name, Count) frame, skipping categories with no rows."""
+    value_counts = series.value_counts()
+    return value_counts[value_counts > 0].rename_axis(name).reset_index(name="Count")
+
+# Bounded like the figure caches: each district subset is its own ~100 KB entry
+@st.cache_data(show_spinner=False, max_entries=32)
+def compute_aggregates(_df, genders, races, districts):
+    """Computes every KPI and chart summary for one filter selection in a single place."""
+    dff = apply_filters(_df, genders, races, districts)
+
+    nutrition_mode = dff["Status_Pemakanan"].mode()
+    nutrition_count = counts(dff["Status_Pemakanan"], "Status")
+    # Group order is irrelevant here (nlargest/sort_values reorder it), so skip the sort
+    bmi_by_district = dff.groupby("DAERAH", observed=True, sort=False, dropna=True)["BMI"].mean()
+    # The source has BMI entries up to ~133,000, so the density charts and their trend lines
+    # use Q1-3*IQR..Q3+3*IQR (~5-27 on the full data); a percentile cut still leaves one flat band
+    bmi_range = robust_range(dff["BMI"])
+
+    return {
+        # KPI scalars
+        "total_children": len(dff),
+        "unique_districts": dff["DAERAH"].nunique(),
+        "average_bmi": dff["BMI"].mean(),
+        "average_income": dff["Avg_Parental_Income"].mean(),
+        "most_common_nutrition": nutrition_mode[0] if not nutrition_mode.empty else "N/A",
+        "nutrition_counts": nutrition_count.set_index("Status")["Count"],
+        "correlation": pearson_corr(dff["Avg_Parental_Income"], dff["BMI"]),
+        # Chart inputs
+        "gender_count": counts(dff["JANTINA"], "JANTINA"),
+        "race_count": counts(dff["BANGSA"], "Race"),
+        "religion_count": counts(dff["AGAMA"], "Religion"),
+        "nutrition_count": nutrition_count,
+        "income_nutrition": dff.groupby(["Pendapatan_Keluarga", "Status_Pemakanan"], observed=True).size().reset_index(name="Count"),
+        # Top 15 by partial selection; the full ordering is only needed for the stacked chart
+        "bmi_district": bmi_by_district.nlargest(15).reset_index(),
+        "district_order": tuple(bmi_by_district.sort_values(ascending=False).index),
+        "nutrition_district": dff.groupby(["DAERAH", "Status_Pemakanan"], observed=True).size().reset_index(name="Count"),
+        "district_count": counts(dff["DAERAH"], "DAERAH"),
+        "bmi_age_trends": fit_trend_lines(dff, "Umur_Bulan", "BMI", "JANTINA", y_range=bmi_range),
+        # Binned points for the density charts (O(bins) payload instead of O(rows))
+        "bmi_age_bins": bin_points(dff, "Umur_Bulan", "BMI", "JANTINA", nbinsx=60, nbinsy=40, y_range=bmi_range),
+        "income_bmi_bins": bin_points(dff, "Avg_Parental_Income", "BMI", "JANTINA", nbinsx=60, nbinsy=40, y_range=bmi_range),
+    }
+
+@st.cache_data(show_spinner=False)
+def load_feedback(path, mtime):
+    """Parses the questionnaire responses and their averages (mtime keys the cache to the file's last write)."""
+    responses = pd.read_csv(path)
+    return {
+        "responses": responses,
+        "average_scores": responses[FEEDBACK_SCORE_COLUMNS].mean(),
+        "csv_bytes": Path(path).read_bytes(),
+    }
+
+# ==========================================
+# CHART BUILDERS
+# ==========================================
+# Figures are cached as shared resources keyed on the aggregated rows, so an
+# unchanged selection reuses the exact same Figure object. Never mutate them.
+
+def as_rows(frame):
+    """Converts a small aggregate frame into hashable row tuples for the figure cache."""
+    return tuple(frame.itertuples(index=False, name=None))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_demographics_figure(gender_rows, race_rows):
+    """Gender donut and top 10 race bar side by side, from (JANTINA, Count) and (Race, Count) rows."""
+    gender = pd.DataFrame(gender_rows, columns=["JANTINA", "Count"])
+    race = pd.DataFrame(race_rows, columns=["Race", "Count"]).head(10)
+
+    # One figure means one Plotly.js instance in the browser instead of two
+    fig = make_subplots(
+        rows=1,
+        cols=2,
+        specs=[[{"type": "domain"}, {"type": "xy"}]],
+        subplot_titles=["Gender Distribution", "Top 10 Race Distribution"]
+    )
+    fig.add_trace(go.Pie(
+        labels=gender["JANTINA"],
+        values=gender["Count"],
+        hole=0.4,
+        textinfo="percent+label",
+        marker=dict(colors=px.colors.qualitative.Set3),
+        showlegend=False
+    ), row=1, col=1)
+    palette = px.colors.qualitative.Plotly
+    fig.add_trace(go.Bar(
+        x=race["Race"],
+        y=race["Count"],
+        marker=dict(color=[palette[i % len(palette)] for i in range(len(race))]),
+        showlegend=False
+    ), row=1, col=2)
+    fig.update_xaxes(title_text="Race", row=1, col=2)
+    fig.update_yaxes(title_text="Count", row=1, col=2)
+    fig.update_layout(template="plotly_white")
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_religion_pie(rows):
+    """Religion pie chart from (Religion, Count) rows."""
+    return px.pie(
+        pd.DataFrame(rows, columns=["Religion", "Count"]),
+        names="Religion",
+        values="Count",
+        title="Religion Distribution",
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_nutrition_bar(rows):
+    """Nutrition status bar chart from (Status, Count) rows."""
+    return px.bar(
+        pd.DataFrame(rows, columns=["Status", "Count"]),
+        x="Status",
+        y="Count",
+        color="Status",
+        title="Nutrition Status Distribution",
+        color_discrete_sequence=px.colors.qualitative.Bold,
+        template="plotly_white"
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_income_nutrition_bar(rows):
+    """Stacked household income vs nutrition status chart from (income, status, Count) rows."""
+    return px.bar(
+        pd.DataFrame(rows, columns=["Pendapatan_Keluarga", "Status_Pemakanan", "Count"]),
+        x="Pendapatan_Keluarga",
+        y="Count",
+        color="Status_Pemakanan",
+        title="Household Income vs Nutrition Status",
+        barmode="stack",
+        template="plotly_white"
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_bmi_district_bar(rows):
+    """Top 15 average BMI by district chart from (DAERAH, BMI) rows."""
+    return px.bar(
+        pd.DataFrame(rows, columns=["DAERAH", "BMI"]),
+        x="DAERAH",
+        y="BMI",
+        color="DAERAH",
+        title="Average BMI by District (Top 15)",
+        template="plotly_white"
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_nutrition_district_bar(rows, district_order):
+    """Stacked nutrition status by district chart from (DAERAH, status, Count) rows."""
+    return px.bar(
+        pd.DataFrame(rows, columns=["DAERAH", "Status_Pemakanan", "Count"]),
+        x="DAERAH",
+        y="Count",
+        color="Status_Pemakanan",
+        title="Nutrition Status Counts by District",
+        barmode="stack",
+        template="plotly_white",
+        # Order districts by BMI for a slightly more structured look
+        category_orders={"DAERAH": list(district_order)}
+    ).update_traces(marker_line_width=0)  # ~150 bars per trace; skip drawing an outline on each
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_district_count_bar(rows):
+    """Number of children by district chart from (DAERAH, Count) rows."""
+    district_count = pd.DataFrame(rows, columns=["DAERAH", "Count"])
+    # One trace with per-bar colours; color="DAERAH" would emit a trace and legend entry per district
+    palette = px.colors.qualitative.Plotly
+    fig = go.Figure(go.Bar(
+        x=district_count["DAERAH"],
+        y=district_count["Count"],
+        marker=dict(color=[palette[i % len(palette)] for i in range(len(district_count))], line_width=0)
+    ))
+    fig.update_layout(
+        title="Number of Children by District",
+        template="plotly_white",
+        xaxis_title="DAERAH",
+        yaxis_title="Count"
+    )
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_feedback_scores_bar(rows):
+    """Average questionnaire rating per question from (Question, Average Rating) rows."""
+    return px.bar(
+        pd.DataFrame(rows, columns=["Question", "Average Rating"]),
+        x="Question",
+        y="Average Rating",
+        title="Average Scores for Each Question",
+        template="plotly_white"
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_density_heatmap(binned, trends, title, x_label, y_label):
+    """One count heatmap per gender from bin_points(), with optional per-gender trend lines."""
+    groups = list(binned["counts"])
+    fig = make_subplots(rows=1, cols=max(len(groups), 1), shared_yaxes=True, subplot_titles=[str(g) for g in groups])
+    if not groups:
+        return fig.update_layout(title=title, template="plotly_white")
+
+    x_edges, y_edges = binned["x_edges"], binned["y_edges"]
+    x_mid = (x_edges[:-1] + x_edges[1:]) / 2
+    y_mid = (y_edges[:-1] + y_edges[1:]) / 2
+
+    for col, group in enumerate(groups, start=1):
+        fig.add_trace(go.Heatmap(
+            x=x_mid,
+            y=y_mid,
+            z=binned["counts"][group],
+            coloraxis="coloraxis",
+            hovertemplate=f"{x_label}=%{{x}}<br>{y_label}=%{{y}}<br>Children=%{{z}}<extra>{group}</extra>",
+        ), row=1, col=col)
+        segment = clip_segment(trends[group], y_edges[0], y_edges[-1]) if group in trends else None
+        if segment is not None:
+            x_start, x_end, slope, intercept = segment
+            fig.add_trace(go.Scatter(
+                x=[x_start, x_end],
+                y=[slope * x_start + intercept, slope * x_end + intercept],
+                mode="lines",
+                line=dict(color="white", width=2),
+                showlegend=False,
+                hoverinfo="skip",
+            ), row=1, col=col)
+
+    if binned["outside"]:
+        # Say how many children are not drawn rather than dropping them silently
+        title += (
+            f"<br><sup>{binned['outside']:,} children with {y_label} outside "
+            f"{y_edges[0]:.1f}–{y_edges[-1]:.1f} are not shown</sup>"
+        )
+    fig.update_layout(title=title, template="plotly_white", coloraxis=dict(colorscale="Viridis", colorbar_title="Children"))
+    fig.update_xaxes(title_text=x_label, range=[x_edges[0], x_edges[-1]])
+    fig.update_yaxes(range=[y_edges[0], y_edges[-1]])
+    fig.update_yaxes(title_text=y_label, row=1, col=1)
+    return fig
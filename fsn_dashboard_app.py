@@ -3,33 +3,34 @@
 # Dataset: UMK DATA ANAK 2022 (CLEANED)
 # =========================================================
 
-import pandas as pd
 import streamlit as st
-import plotly.express as px
+
+from fsn_core import (
+    CLEANED_CSV_URL,
+    STATIC_CHART_CONFIG,
+    as_rows,
+    build_bmi_district_bar,
+    build_demographics_figure,
+    build_density_heatmap,
+    build_district_count_bar,
+    build_income_nutrition_bar,
+    build_nutrition_bar,
+    build_nutrition_district_bar,
+    build_religion_pie,
+    compute_aggregates,
+    filter_options,
+    load_and_prepare_data,
+    make_filter_key,
+)
 
 # ==========================================
-# CONSTANT & DATA LOADING
+# DATA LOADING
 # ==========================================
-CLEANED_CSV_URL = 'https://raw.githubusercontent.com/s22a0058-ai/FYP/refs/heads/main/cleaned_UMK_DATA_ANAK_2022.csv'
-
-@st.cache_data
-def load_data(file_url):
-    """Loads the cleaned dataset from a public URL."""
-    try:
-        df = pd.read_csv(file_url)
-        
-        # Ensure 'Avg_Parental_Income' exists before filtering
-        df["Avg_Parental_Income"] = df[["Gaji_Bapa", "Gaji_Ibu"]].mean(axis=1)
-
-        # Standardize 'index' column names for value_counts() to 'Category' and 'Count'
-        # This prevents the need to hardcode 'index' later.
-        
-        return df
-    except Exception as e:
-        st.error(f"Failed to load data from URL: {e}")
-        st.stop()
-        
-df = load_data(CLEANED_CSV_URL)
+# Loading, filtering and aggregation live in fsn_core.py
+df = load_and_prepare_data(CLEANED_CSV_URL)
+
+if df.empty:
+    st.stop()
 
 # ------------------------------------------
 # SIDEBAR FILTERS
@@ -37,30 +38,29 @@ df = load_data(CLEANED_CSV_URL)
 st.sidebar.title("🔍 Filters")
 
 # Dropdown filters
+options = filter_options(df)
+
 gender_filter = st.sidebar.multiselect(
     "Select Gender",
-    options=df["JANTINA"].dropna().unique(),
-    default=df["JANTINA"].dropna().unique()
+    options=options["JANTINA"],
+    default=options["JANTINA"]
 )
 
 race_filter = st.sidebar.multiselect(
     "Select Race",
-    options=df["BANGSA"].dropna().unique(),
-    default=df["BANGSA"].dropna().unique()
+    options=options["BANGSA"],
+    default=options["BANGSA"]
 )
 
 district_filter = st.sidebar.multiselect(
     "Select District",
-    options=df["DAERAH"].dropna().unique(),
-    default=df["DAERAH"].dropna().unique()
+    options=options["DAERAH"],
+    default=options["DAERAH"]
 )
 
 # Apply filters
-df_filtered = df[
-    (df["JANTINA"].isin(gender_filter)) &
-    (df["BANGSA"].isin(race_filter)) &
-    (df["DAERAH"].isin(district_filter))
-]
+filter_key = make_filter_key(gender_filter, race_filter, district_filter)
+agg = compute_aggregates(df, *filter_key)
 
 # ------------------------------------------
 # DASHBOARD TITLE
@@ -75,9 +75,9 @@ You can explore relationships between **income, BMI, and nutrition status** by g
 # KPI METRICS SECTION
 # ------------------------------------------
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Children", len(df_filtered))
-col2.metric("Unique Districts", df_filtered["DAERAH"].nunique())
-col3.metric("Average BMI", round(df_filtered["BMI"].mean(), 2))
+col1.metric("Total Children", agg["total_children"])
+col2.metric("Unique Districts", agg["unique_districts"])
+col3.metric("Average BMI", round(agg["average_bmi"], 2))
 
 st.divider()
 
@@ -92,39 +92,12 @@ tab1, tab2, tab3, tab4 = st.tabs(["🧒 Demographics", "🥗 Nutrition", "💰 I
 with tab1:
     st.subheader("🧒 Demographic Overview")
 
-    # Gender distribution
-    fig_gender = px.pie(
-        df_filtered,
-        names="JANTINA",
-        title="Gender Distribution",
-        color_discrete_sequence=px.colors.qualitative.Set3,
-        hole=0.4
-    )
-    fig_gender.update_traces(textinfo="percent+label")
-
-    # Race distribution
-    race_count = df_filtered["BANGSA"].value_counts().reset_index()
-    fig_race = px.bar(
-        race_count,
-        x="index",
-        y="BANGSA",
-        color="index",
-        title="Race Distribution"
-    )
-
-    # Religion distribution
-    religion_count = df_filtered["AGAMA"].value_counts().reset_index()
-    fig_religion = px.pie(
-        religion_count,
-        names="index",
-        values="AGAMA",
-        title="Religion Distribution",
-        color_discrete_sequence=px.colors.qualitative.Pastel
-    )
+    # Chart builders are shared with main.py (fsn_core.py)
+    fig_demographics = build_demographics_figure(as_rows(agg["gender_count"]), as_rows(agg["race_count"]))
+    fig_religion = build_religion_pie(as_rows(agg["religion_count"]))
 
-    st.plotly_chart(fig_gender, use_container_width=True)
-    st.plotly_chart(fig_race, use_container_width=True)
-    st.plotly_chart(fig_religion, use_container_width=True)
+    st.plotly_chart(fig_demographics, use_container_width=True, config=STATIC_CHART_CONFIG)
+    st.plotly_chart(fig_religion, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 # ------------------------------------------
 # TAB 2: NUTRITION
@@ -133,35 +106,15 @@ with tab2:
     st.subheader("🥗 Nutrition Analysis")
 
     # Nutrition Status Distribution
-    fig_nutrition = px.bar(
-        df_filtered["Status_Pemakanan"].value_counts().reset_index(),
-        x="index",
-        y="Status_Pemakanan",
-        color="index",
-        title="Nutrition Status Distribution",
-        color_discrete_sequence=px.colors.qualitative.Bold
-    )
+    fig_nutrition = build_nutrition_bar(as_rows(agg["nutrition_count"]))
 
     # BMI vs Age
-    fig_bmi_age = px.scatter(
-        df_filtered,
-        x="Umur_Bulan",
-        y="BMI",
-        color="JANTINA",
-        trendline="ols",
-        title="BMI vs Age (Months) by Gender",
-        hover_data=["BANGSA", "Status_Pemakanan"]
+    fig_bmi_age = build_density_heatmap(
+        agg["bmi_age_bins"], agg["bmi_age_trends"], "BMI vs Age (Months) by Gender", "Umur_Bulan", "BMI"
     )
 
     # BMI by District
-    bmi_district = df_filtered.groupby("DAERAH")["BMI"].mean().sort_values(ascending=False).reset_index()
-    fig_bmi_district = px.bar(
-        bmi_district.head(15),
-        x="DAERAH",
-        y="BMI",
-        color="DAERAH",
-        title="Average BMI by District (Top 15)"
-    )
+    fig_bmi_district = build_bmi_district_bar(as_rows(agg["bmi_district"]))
 
     st.plotly_chart(fig_nutrition, use_container_width=True)
     st.plotly_chart(fig_bmi_age, use_container_width=True)
@@ -174,25 +127,11 @@ with tab3:
     st.subheader("💰 Income and Nutrition Relationship")
 
     # Income vs Nutrition Status
-    income_nutrition = df_filtered.groupby(["Pendapatan_Keluarga", "Status_Pemakanan"]).size().reset_index(name="Count")
-    fig_income = px.bar(
-        income_nutrition,
-        x="Pendapatan_Keluarga",
-        y="Count",
-        color="Status_Pemakanan",
-        title="Household Income vs Nutrition Status",
-        barmode="stack"
-    )
+    fig_income = build_income_nutrition_bar(as_rows(agg["income_nutrition"]))
 
-    # Parents' income vs BMI
-    df_filtered["Avg_Parental_Income"] = df_filtered[["Gaji_Bapa", "Gaji_Ibu"]].mean(axis=1)
-    fig_income_bmi = px.scatter(
-        df_filtered,
-        x="Avg_Parental_Income",
-        y="BMI",
-        color="JANTINA",
-        title="Average Parental Income vs BMI",
-        hover_data=["DAERAH", "Status_Pemakanan"]
+    # Parents' income vs BMI (Avg_Parental_Income comes from the cached loader)
+    fig_income_bmi = build_density_heatmap(
+        agg["income_bmi_bins"], {}, "Average Parental Income vs BMI", "Avg_Parental_Income", "BMI"
     )
 
     st.plotly_chart(fig_income, use_container_width=True)
@@ -205,28 +144,15 @@ with tab4:
     st.subheader("📍 Regional Insights")
 
     # Nutrition by district
-    nutrition_district = df_filtered.groupby(["DAERAH", "Status_Pemakanan"]).size().reset_index(name="Count")
-    fig_nutrition_district = px.bar(
-        nutrition_district,
-        x="DAERAH",
-        y="Count",
-        color="Status_Pemakanan",
-        title="Nutrition Status by District",
-        barmode="stack"
+    fig_nutrition_district = build_nutrition_district_bar(
+        as_rows(agg["nutrition_district"]), agg["district_order"]
     )
 
     # District comparison
-    district_count = df_filtered["DAERAH"].value_counts().reset_index()
-    fig_district = px.bar(
-        district_count,
-        x="index",
-        y="DAERAH",
-        color="index",
-        title="Number of Children by District"
-    )
+    fig_district = build_district_count_bar(as_rows(agg["district_count"]))
 
-    st.plotly_chart(fig_nutrition_district, use_container_width=True)
-    st.plotly_chart(fig_district, use_container_width=True)
+    st.plotly_chart(fig_nutrition_district, use_container_width=True, config=STATIC_CHART_CONFIG)
+    st.plotly_chart(fig_district, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 # ------------------------------------------
 # FOOTER SUMMARY
@@ -1,8 +1,28 @@
+import os
+
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
+
+from fsn_core import (
+    CLEANED_CSV_URL,
+    FEEDBACK_CSV_PATH,
+    STATIC_CHART_CONFIG,
+    as_rows,
+    build_bmi_district_bar,
+    build_demographics_figure,
+    build_density_heatmap,
+    build_feedback_scores_bar,
+    build_income_nutrition_bar,
+    build_nutrition_bar,
+    build_nutrition_district_bar,
+    build_religion_pie,
+    compute_aggregates,
+    download_csv_bytes,
+    filter_options,
+    load_and_prepare_data,
+    make_filter_key,
+    load_feedback,
+)
 
 # Set Streamlit page configuration
 st.set_page_config(
@@ -11,32 +31,10 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# Use the URL for robust deployment
-CLEANED_CSV_URL = 'https://raw.githubusercontent.com/s22a0058-ai/FYP/refs/heads/main/cleaned_UMK_DATA_ANAK_2022.csv'
-
 # ==========================================
 # 1. DATA LOADING AND PREPARATION
 # ==========================================
-
-@st.cache_data
-def load_and_prepare_data(file_url):
-    """Loads, processes, and prepares the dataset."""
-    try:
-        # Load Dataset from URL
-        df = pd.read_csv(file_url)
-        
-        # Ensure key columns are numeric
-        for col in ["Berat_KG", "Tinggi_CM", "Umur_Bulan", "Gaji_Bapa", "Gaji_Ibu", "Gaji_Penjaga", "BMI"]:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Calculate Average Parental Income
-        df["Avg_Parental_Income"] = df[["Gaji_Bapa", "Gaji_Ibu"]].mean(axis=1)
-
-        return df
-
-    except Exception as e:
-        st.error(f"Error loading data from URL. Please check the path. Details: {e}")
-        return pd.DataFrame()
+# Loading, filtering, aggregation and chart builders live in fsn_core.py
 
 # --- Load Data ---
 df = load_and_prepare_data(CLEANED_CSV_URL)
@@ -51,45 +49,51 @@ st.sidebar.title("🔍 Filter Data")
 st.sidebar.markdown("Adjust filters below to interact with the charts.")
 
 # Filter inputs
+options = filter_options(df)
+
 gender_filter = st.sidebar.multiselect(
     "Select Gender",
-    options=df["JANTINA"].dropna().unique(),
-    default=df["JANTINA"].dropna().unique()
+    options=options["JANTINA"],
+    default=options["JANTINA"]
 )
 
 race_filter = st.sidebar.multiselect(
     "Select Race",
-    options=df["BANGSA"].dropna().unique(),
-    default=df["BANGSA"].dropna().unique()
+    options=options["BANGSA"],
+    default=options["BANGSA"]
 )
 
 district_filter = st.sidebar.multiselect(
     "Select District (DAERAH)",
-    options=df["DAERAH"].dropna().unique(),
-    default=df["DAERAH"].dropna().unique()
+    options=options["DAERAH"],
+    default=options["DAERAH"]
 )
 
 # Apply filters
-df_filtered = df[
-    (df["JANTINA"].isin(gender_filter)) &
-    (df["BANGSA"].isin(race_filter)) &
-    (df["DAERAH"].isin(district_filter))
-]
+filter_key = make_filter_key(gender_filter, race_filter, district_filter)
+# Only the cached aggregates are read below; st.cache_data would hand back a
+# fresh copy of the filtered frame on every rerun
+agg = compute_aggregates(df, *filter_key)
 
 # Sidebar metrics and download
 st.sidebar.markdown("---")
 st.sidebar.header("Data Summary")
-st.sidebar.metric("Records Filtered", len(df_filtered))
-st.sidebar.metric("Average BMI (Filtered)", f"{df_filtered['BMI'].mean():.2f}")
+st.sidebar.metric("Records Filtered", agg["total_children"])
+st.sidebar.metric("Average BMI (Filtered)", f"{agg['average_bmi']:.2f}")
 
 st.sidebar.markdown("---")
-csv = df.to_csv(index=False).encode('utf-8')
-st.sidebar.download_button(
-    label="⬇️ Download Cleaned Data CSV",
-    data=csv,
-    file_name='cleaned_UMK_DATA_ANAK_2022_filtered.csv',
-    mime='text/csv',
-)
+# Served from the source file itself, so every column (incl. cm_rec_id) and the original row order survive
+source_bytes, source_error = download_csv_bytes(CLEANED_CSV_URL)
+if source_error is not None:
+    st.sidebar.warning(f"Download unavailable: could not fetch the source CSV. Details: {source_error}")
+
+if source_bytes is not None:
+    st.sidebar.download_button(
+        label="⬇️ Download Cleaned Data CSV",
+        data=source_bytes,
+        file_name='cleaned_UMK_DATA_ANAK_2022_filtered.csv',
+        mime='text/csv',
+    )
 
 # ==========================================
 # 3. MAIN DASHBOARD CONTENT
@@ -97,25 +101,24 @@ st.sidebar.download_button(
 
 st.title("📊 Food Security & Nutrition (FSN) Analysis")
 st.subheader("UMK Data Anak 2022")
-st.markdown(f"Total Children in Filter: {len(df_filtered)}")
+st.markdown(f"Total Children in Filter: {agg['total_children']}")
 
-if df_filtered.empty:
+if agg["total_children"] == 0:
     st.warning("No data matches the current filters. Please adjust the sidebar selections.")
     st.stop()
 
 # --- KPI Metrics Row ---
 # --- KPI METRICS SECTION (Enhanced) ---
-# Calculate key summary values
-total_children = len(df_filtered)
-unique_districts = df_filtered["DAERAH"].nunique()
-average_bmi = round(df_filtered["BMI"].mean(), 2)
+# Key summary values come from the cached aggregates
+total_children = agg["total_children"]
+unique_districts = agg["unique_districts"]
+average_bmi = round(agg["average_bmi"], 2)
 
-# Calculate average parental income (if available)
-df_filtered["Avg_Parental_Income"] = df_filtered[["Gaji_Bapa", "Gaji_Ibu"]].mean(axis=1)
-average_income = round(df_filtered["Avg_Parental_Income"].mean(), 2)
+# Average parental income (the column is computed once in the cached loader)
+average_income = round(agg["average_income"], 2)
 
 # Most common nutrition status
-most_common_nutrition = df_filtered["Status_Pemakanan"].mode()[0] if not df_filtered["Status_Pemakanan"].mode().empty else "N/A"
+most_common_nutrition = agg["most_common_nutrition"]
 
 # Display KPI cards
 col1, col2, col3, col4 = st.columns(4)
@@ -131,9 +134,8 @@ col4.metric("Average Parental Income (RM)", f"{average_income:,.2f}")
 st.markdown("### 🧠 Food Security & Nutrition Insights")
 
 # --- Calculate Nutrition Summary Metrics ---
-if "Status_Pemakanan" in df_filtered.columns:
-    total_children = len(df_filtered)
-    nutrition_counts = df_filtered["Status_Pemakanan"].value_counts()
+if "Status_Pemakanan" in df.columns:
+    nutrition_counts = agg["nutrition_counts"]
     normal_count = nutrition_counts.get("Normal", 0)
     underweight_count = nutrition_counts.get("Kurus", 0)
     overweight_count = nutrition_counts.get("Gemuk", 0)
@@ -149,8 +151,8 @@ if "Status_Pemakanan" in df_filtered.columns:
     colC.metric("Overweight (%)", f"{overweight_pct:.1f}%")
 
 # --- Correlation between Income and BMI ---
-if "Avg_Parental_Income" in df_filtered.columns:
-    correlation = df_filtered["Avg_Parental_Income"].corr(df_filtered["BMI"])
+if "Avg_Parental_Income" in df.columns:
+    correlation = agg["correlation"]
     st.metric("Correlation (Income vs BMI)", f"{correlation:.2f}")
 
 # --- Short Insight Summary ---
@@ -180,47 +182,15 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(["🧒 Demographics", "🥗 Nutrition & H
 with tab1:
     st.subheader("Demographic Distributions")
     
-    col_g, col_r = st.columns(2)
-
-    with col_g:
-        st.caption("Gender Distribution")
-        # Gender distribution
-        fig_gender = px.pie(
-            df_filtered,
-            names="JANTINA",
-            color="JANTINA",
-            title="Gender Distribution",
-            color_discrete_sequence=px.colors.qualitative.Set3,
-            hole=0.4
-        )
-        fig_gender.update_traces(textinfo="percent+label")
-        st.plotly_chart(fig_gender, use_container_width=True)
-
-    with col_r:
-        st.caption("Top Race Distribution")
-        # Race distribution (Fixed column naming)
-        race_count = df_filtered["BANGSA"].value_counts().reset_index(name="Count").rename(columns={'index': 'Race', 'BANGSA': 'Race'})
-        fig_race = px.bar(
-            race_count.head(10),
-            x="Race",
-            y="Count",
-            color="Race",
-            title="Top 10 Race Distribution",
-            template="plotly_white"
-        )
-        st.plotly_chart(fig_race, use_container_width=True)
+    # Gender and race distribution (one subplot figure)
+    fig_demographics = build_demographics_figure(as_rows(agg["gender_count"]), as_rows(agg["race_count"]))
+    st.plotly_chart(fig_demographics, use_container_width=True, config=STATIC_CHART_CONFIG)
 
     st.caption("Religion Distribution")
-    # Religion distribution (Fixed column naming)
-    religion_count = df_filtered["AGAMA"].value_counts().reset_index(name="Count").rename(columns={'index': 'Religion', 'AGAMA': 'Religion'})
-    fig_religion = px.pie(
-        religion_count,
-        names="Religion",
-        values="Count",
-        title="Religion Distribution",
-        color_discrete_sequence=px.colors.qualitative.Pastel
-    )
-    st.plotly_chart(fig_religion, use_container_width=True)
+    # Religion distribution
+    religion_count = agg["religion_count"]
+    fig_religion = build_religion_pie(as_rows(religion_count))
+    st.plotly_chart(fig_religion, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 
 # ------------------------------------------
@@ -233,31 +203,16 @@ with tab2:
     
     with col_n:
         st.caption("Nutrition Status Distribution")
-        # Nutrition Status Distribution (Fixed column naming)
-        nutrition_count = df_filtered["Status_Pemakanan"].value_counts().reset_index(name="Count").rename(columns={'index': 'Status', 'Status_Pemakanan': 'Status'})
-        fig_nutrition = px.bar(
-            nutrition_count,
-            x="Status",
-            y="Count",
-            color="Status",
-            title="Nutrition Status Distribution",
-            color_discrete_sequence=px.colors.qualitative.Bold,
-            template="plotly_white"
-        )
+        # Nutrition Status Distribution
+        nutrition_count = agg["nutrition_count"]
+        fig_nutrition = build_nutrition_bar(as_rows(nutrition_count))
         st.plotly_chart(fig_nutrition, use_container_width=True)
 
     with col_a:
         st.caption("BMI vs Age (Months) by Gender")
-        # BMI vs Age (Scatter with Trendline)
-        fig_bmi_age = px.scatter(
-            df_filtered,
-            x="Umur_Bulan",
-            y="BMI",
-            color="JANTINA",
-            trendline="ols",
-            title="BMI vs Age (Months)",
-            hover_data=["BANGSA", "Status_Pemakanan"],
-            template="plotly_white"
+        # BMI vs Age (Binned density per gender with Trendline)
+        fig_bmi_age = build_density_heatmap(
+            agg["bmi_age_bins"], agg["bmi_age_trends"], "BMI vs Age (Months)", "Umur_Bulan", "BMI"
         )
         st.plotly_chart(fig_bmi_age, use_container_width=True)
 
@@ -272,32 +227,17 @@ with tab3:
     with col_inc_nut:
         st.caption("Household Income vs Nutrition Status")
         # Income vs Nutrition Status (Stacked Bar)
-        income_nutrition = df_filtered.groupby(["Pendapatan_Keluarga", "Status_Pemakanan"]).size().reset_index(name="Count")
-        fig_income = px.bar(
-            income_nutrition,
-            x="Pendapatan_Keluarga",
-            y="Count",
-            color="Status_Pemakanan",
-            title="Household Income vs Nutrition Status",
-            barmode="stack",
-            template="plotly_white"
-        )
+        income_nutrition = agg["income_nutrition"]
+        fig_income = build_income_nutrition_bar(as_rows(income_nutrition))
         st.plotly_chart(fig_income, use_container_width=True)
 
 with col_inc_bmi:
         st.caption("Average Parental Income vs BMI")
-        # Parents' income vs BMI (Scatter)
-        # Note: Avg_Parental_Income is calculated on the main df, but df_filtered is a copy.
-        # This chart relies on the column being present in df_filtered, which it is, 
-        # but the use of df_filtered.groupby/plot is correct.
-        fig_income_bmi = px.scatter(
-            df_filtered,
-            x="Avg_Parental_Income",
-            y="BMI",
-            color="JANTINA",
-            title="Average Parental Income (RM) vs BMI",
-            hover_data=["DAERAH", "Status_Pemakanan"],
-            template="plotly_white"
+        # Parents' income vs BMI (Binned density per gender)
+        # Note: Avg_Parental_Income is calculated once on the main df in the loader,
+        # and filtering keeps the column, so the filtered rows are never written to here.
+        fig_income_bmi = build_density_heatmap(
+            agg["income_bmi_bins"], {}, "Average Parental Income (RM) vs BMI", "Avg_Parental_Income", "BMI"
         )
         st.plotly_chart(fig_income_bmi, use_container_width=True)
 
@@ -308,45 +248,34 @@ with col_inc_bmi:
 with tab4:
     st.subheader("Geographical Distribution and Metrics")
 
-    # Recalculate BMI by District on filtered data for consistent ordering
-    bmi_district_filtered = df_filtered.groupby("DAERAH")["BMI"].mean().sort_values(ascending=False).reset_index()
+    # Top 15 BMI by District on filtered data (precomputed)
+    bmi_district_filtered = agg["bmi_district"]
 
     col_bmi_dist, col_nut_dist = st.columns(2)
 
     with col_bmi_dist:
         st.caption("Average BMI by District")
         # BMI by District (Bar - Top 15)
-        fig_bmi_district = px.bar(
-            bmi_district_filtered.head(15),
-            x="DAERAH",
-            y="BMI",
-            color="DAERAH",
-            title="Average BMI by District (Top 15)",
-            template="plotly_white"
-        )
-        st.plotly_chart(fig_bmi_district, use_container_width=True)
+        fig_bmi_district = build_bmi_district_bar(as_rows(bmi_district_filtered))
+        st.plotly_chart(fig_bmi_district, use_container_width=True, config=STATIC_CHART_CONFIG)
 
     with col_nut_dist:
         st.caption("Nutrition Status by District (Stacked)")
         # Nutrition by district (Stacked Bar)
-        nutrition_district = df_filtered.groupby(["DAERAH", "Status_Pemakanan"]).size().reset_index(name="Count")
-        fig_nutrition_district = px.bar(
-            nutrition_district,
-            x="DAERAH",
-            y="Count",
-            color="Status_Pemakanan",
-            title="Nutrition Status Counts by District",
-            barmode="stack",
-            template="plotly_white",
-            # Order districts by BMI for a slightly more structured look
-            category_orders={"DAERAH": bmi_district_filtered['DAERAH'].tolist()} 
+        nutrition_district = agg["nutrition_district"]
+        fig_nutrition_district = build_nutrition_district_bar(
+            as_rows(nutrition_district),
+            agg["district_order"],
         )
-        st.plotly_chart(fig_nutrition_district, use_container_width=True)
+        st.plotly_chart(fig_nutrition_district, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 # ------------------------------------------
 # TAB 5: USABILITY EVALUATION (QUESTIONNAIRE)
 # ------------------------------------------
-with tab5:
+# A fragment, so moving a slider or typing feedback reruns only this tab
+# instead of the whole dashboard
+@st.fragment
+def usability_evaluation():
     st.subheader("🧩 Dashboard Usability Evaluation")
     st.markdown("Please answer the following questions to help us improve the dashboard:")
 
@@ -404,13 +333,10 @@ with tab5:
             "Improvement_Suggestion": open2
         }])
 
-        try:
-            existing = pd.read_csv("usability_responses.csv")
-            updated = pd.concat([existing, new_response], ignore_index=True)
-        except FileNotFoundError:
-            updated = new_response
-
-        updated.to_csv("usability_responses.csv", index=False)
+        # Append the single row; only a brand-new file needs the header
+        header_needed = not os.path.exists(FEEDBACK_CSV_PATH)
+        new_response.to_csv(FEEDBACK_CSV_PATH, mode="a", header=header_needed, index=False)
+        load_feedback.clear()
         st.success("✅ Thank you! Your responses have been successfully recorded.")
 
     st.markdown("---")
@@ -427,7 +353,9 @@ with tab5:
 
         if password == "fsn2025":
             try:
-                df_feedback = pd.read_csv("usability_responses.csv")
+                # Re-parsed only when the file changes (new mtime)
+                feedback = load_feedback(FEEDBACK_CSV_PATH, os.path.getmtime(FEEDBACK_CSV_PATH))
+                df_feedback = feedback["responses"]
 
                 st.markdown("### 📋 All Collected Questionnaire Responses")
                 st.dataframe(df_feedback, use_container_width=True)
@@ -435,28 +363,20 @@ with tab5:
                 # Summary stats
                 st.markdown("### 📊 Summary of Ratings")
 
-                numeric_cols = [
-                    "Q1_Easy_Navigation", "Q2_Clear_Information", "Q3_Visual_Appeal",
-                    "Q4_Easy_Filters", "Q5_Charts_Helpful", "Q6_Useful_Insights",
-                    "Q7_Identify_Trends", "Q8_Overall_Satisfaction"
-                ]
-                avg_scores = df_feedback[numeric_cols].mean()
+                avg_scores = feedback["average_scores"]
 
                 st.write(avg_scores)
 
-                fig_avg = px.bar(
-                    avg_scores,
-                    title="Average Scores for Each Question",
-                    labels={"index": "Question", "value": "Average Rating"},
-                    template="plotly_white"
+                # Cached on the averaged rows, so admin reruns reuse the same figure
+                fig_avg = build_feedback_scores_bar(
+                    as_rows(avg_scores.rename_axis("Question").reset_index(name="Average Rating"))
                 )
                 st.plotly_chart(fig_avg, use_container_width=True)
 
                 # Download option
-                csv_data = df_feedback.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     label="⬇️ Download All Responses (CSV)",
-                    data=csv_data,
+                    data=feedback["csv_bytes"],
                     file_name="usability_responses.csv",
                     mime="text/csv"
                 )
@@ -473,5 +393,7 @@ with tab5:
     analysis of user feedback, helping evaluate the dashboard’s usability and effectiveness.
     """)
 
+with tab5:
+    usability_evaluation()
 
 st.success("✅ Dashboard loaded successfully! Use the sidebar filters to explore the data.")